@@ -3,34 +3,312 @@ const axios = require('axios');
 const cheerio = require('cheerio');
 const cors = require('cors');
 const fs = require('fs').promises;
+const fsSync = require('fs');
 const path = require('path');
+const os = require('os');
+const http = require('http');
+const https = require('https');
+const crypto = require('crypto');
+const { performance } = require('perf_hooks');
 
 const app = express();
 const PORT = 3000;
 
+const PUBLIC_DIR = path.join(__dirname, 'public');
+const ALARM_FILE = path.join(PUBLIC_DIR, 'alarm.wav');
+
 app.use(cors());
 app.use(express.json());
+
+// The alarm sound is static, so let browsers keep it for a day (Range requests still work)
+app.get('/alarm.wav', (req, res) => {
+  res.sendFile(ALARM_FILE, { maxAge: '1d' });
+});
+
 app.use(express.static('public'));
 
 // Path to products JSON file
 const PRODUCTS_FILE = path.join(__dirname, 'products.json');
 
+// How long to wait after a change before writing products.json, so bursts of edits coalesce
+const SAVE_DEBOUNCE_MS = 1000;
+
+// In-memory copy of products.json, reloaded only when the file's mtime changes.
+// While changes are pending (dirty) or being written, memory is authoritative
+const productsCache = {
+  mtimeNs: 0n,
+  data: [],
+  dirty: false,
+  flushing: false,
+  saveTimer: null,
+  // Reload from disk in progress, shared by concurrent callers
+  reloading: null,
+  // Serialized GET /api/products response, rebuilt only after the products change
+  responseBody: null,
+  responseEtag: null
+};
+
+// Load products from the in-memory cache, re-reading the file only if it changed on disk
+async function loadProducts() {
+  if (productsCache.dirty || productsCache.flushing) {
+    return productsCache.data;
+  }
+
+  if (!productsCache.reloading) {
+    productsCache.reloading = reloadProducts().finally(() => {
+      productsCache.reloading = null;
+    });
+  }
+
+  await productsCache.reloading;
+  return productsCache.data;
+}
+
+// Replace the cached products with the file's contents if it changed on disk.
+// A change made in memory while the file was being read always wins over the file
+async function reloadProducts() {
+  const stat = await fs.stat(PRODUCTS_FILE, { bigint: true });
+
+  if (productsCache.dirty || productsCache.flushing || stat.mtimeNs === productsCache.mtimeNs) {
+    return;
+  }
+
+  const data = await fs.readFile(PRODUCTS_FILE, 'utf8');
+
+  if (productsCache.dirty || productsCache.flushing) {
+    return;
+  }
+
+  productsCache.data = JSON.parse(data);
+  productsCache.mtimeNs = stat.mtimeNs;
+  productsCache.responseBody = null;
+  prunePriceCache(productsCache.data);
+}
+
+// Counter that gives every write its own temp file, so an async write still in progress
+// and the synchronous shutdown write never touch the same file
+let tmpFileCounter = 0;
+
+function nextTmpPath(filePath) {
+  tmpFileCounter++;
+  return `${filePath}.${process.pid}.${tmpFileCounter}.tmp`;
+}
+
+// Write a JSON file atomically: serialize once, write and fsync a temp file, then rename it
+// over the target so a crash never leaves a truncated products.json behind
+async function writeJsonFileAtomic(filePath, data) {
+  const tmpPath = nextTmpPath(filePath);
+
+  try {
+    const handle = await fs.open(tmpPath, 'wx', 0o644);
+
+    try {
+      await handle.writeFile(JSON.stringify(data, null, 2));
+      await handle.sync();
+    } finally {
+      await handle.close();
+    }
+
+    await fs.rename(tmpPath, filePath);
+  } catch (error) {
+    await fs.unlink(tmpPath).catch(() => {});
+    throw error;
+  }
+}
+
+// Synchronous variant of writeJsonFileAtomic for use during shutdown
+function writeJsonFileAtomicSync(filePath, data) {
+  const tmpPath = nextTmpPath(filePath);
+
+  try {
+    const fd = fsSync.openSync(tmpPath, 'wx', 0o644);
+
+    try {
+      fsSync.writeFileSync(fd, JSON.stringify(data, null, 2));
+      fsSync.fsyncSync(fd);
+    } finally {
+      fsSync.closeSync(fd);
+    }
+
+    fsSync.renameSync(tmpPath, filePath);
+  } catch (error) {
+    try {
+      fsSync.unlinkSync(tmpPath);
+    } catch (unlinkError) {
+      // Temp file was never created or is already gone
+    }
+    throw error;
+  }
+}
+
+// Record that the cached products changed and schedule a write to disk
+function markProductsDirty() {
+  productsCache.dirty = true;
+  productsCache.responseBody = null;
+
+  if (!productsCache.saveTimer) {
+    productsCache.saveTimer = setTimeout(flushProducts, SAVE_DEBOUNCE_MS);
+  }
+}
+
+// Write the cached products to disk in the background
+async function flushProducts() {
+  productsCache.saveTimer = null;
+
+  // Never run two writes at once; try again once the current one is done
+  if (productsCache.flushing) {
+    markProductsDirty();
+    return;
+  }
+
+  if (!productsCache.dirty) {
+    return;
+  }
+
+  productsCache.dirty = false;
+  productsCache.flushing = true;
+
+  try {
+    await writeJsonFileAtomic(PRODUCTS_FILE, productsCache.data);
+    const stat = await fs.stat(PRODUCTS_FILE, { bigint: true });
+    productsCache.mtimeNs = stat.mtimeNs;
+  } catch (error) {
+    console.error('Error saving products:', error);
+    markProductsDirty();
+  } finally {
+    productsCache.flushing = false;
+  }
+}
+
+// Write pending changes synchronously; used when the process is shutting down
+function flushProductsSync() {
+  if (productsCache.dirty || productsCache.flushing) {
+    writeJsonFileAtomicSync(PRODUCTS_FILE, productsCache.data);
+    productsCache.dirty = false;
+  }
+}
+
+// Exit with the conventional 128 + signal number status; the 'exit' handler flushes first.
+// SIGUSR2 is how nodemon (npm run dev) restarts the server
+process.on('exit', flushProductsSync);
+['SIGINT', 'SIGTERM', 'SIGUSR2'].forEach(signal => {
+  process.on(signal, () => process.exit(128 + os.constants.signals[signal]));
+});
+
+// Maximum number of product pages fetched from techsiro.com at the same time
+const SCRAPE_CONCURRENCY = 8;
+
+// Map items through an async function with at most `limit` calls in flight,
+// preserving the order of results
+async function mapWithConcurrency(items, limit, fn) {
+  const results = new Array(items.length);
+  let next = 0;
+
+  async function worker() {
+    while (next < items.length) {
+      const index = next++;
+      results[index] = await fn(items[index], index);
+    }
+  }
+
+  const workers = [];
+  for (let i = 0; i < Math.min(limit, items.length); i++) {
+    workers.push(worker());
+  }
+  await Promise.all(workers);
+
+  return results;
+}
+
+// Shared HTTP client so repeated scrapes reuse keep-alive connections
+// instead of paying a new TCP + TLS handshake per product page. The body is
+// kept as raw text and capped in size so an unexpected download can't stall a scrape
+const httpClient = axios.create({
+  headers: {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml'
+  },
+  timeout: 10000,
+  responseType: 'text',
+  maxContentLength: 5 * 1024 * 1024,
+  httpAgent: new http.Agent({ keepAlive: true, maxSockets: SCRAPE_CONCURRENCY }),
+  httpsAgent: new https.Agent({ keepAlive: true, maxSockets: SCRAPE_CONCURRENCY })
+});
+
+const TOMAN = 'تومان';
+const WHITESPACE_REGEX = /\s/;
+
+// Characters allowed in a price: Persian digits, English digits, Persian and Latin separators
+function isPriceChar(code) {
+  return (code >= 0x06F0 && code <= 0x06F9) ||
+    (code >= 0x30 && code <= 0x39) ||
+    code === 0x066C ||
+    code === 0x2C;
+}
+
+// Find every number (with separators) directly followed by تومان, e.g. "۱٬۲۹۹٬۰۰۰ تومان".
+// Jumps between تومان occurrences with indexOf and walks backwards over the number,
+// which is equivalent to /([۰-۹0-9٬,]+)\s*تومان/g but avoids running the regex engine
+function findPriceTexts(text) {
+  const results = [];
+  let pos = text.indexOf(TOMAN);
+
+  while (pos !== -1) {
+    let end = pos;
+    while (end > 0 && WHITESPACE_REGEX.test(text[end - 1])) {
+      end--;
+    }
+
+    let start = end;
+    while (start > 0 && isPriceChar(text.charCodeAt(start - 1))) {
+      start--;
+    }
+
+    if (start < end) {
+      results.push(text.slice(start, end));
+    }
+
+    pos = text.indexOf(TOMAN, pos + TOMAN.length);
+  }
+
+  return results;
+}
+
 // Function to scrape price from techsiro.com product page
 async function scrapePrice(url) {
   try {
-    const response = await axios.get(url, {
-      headers: {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-      },
-      timeout: 10000
-    });
+    const response = await httpClient.get(url);
+
+    // A page without تومان anywhere can't yield a price; don't spend time parsing it
+    if (typeof response.data !== 'string' || !response.data.includes(TOMAN)) {
+      return null;
+    }
 
     const $ = cheerio.load(response.data);
 
     let prices = [];
 
+    // Only elements with a تومان text node somewhere beneath them can contain a price,
+    // so mark those once instead of computing .text() for every element in the page
+    const candidates = new Set();
+    $('*').contents().each((i, node) => {
+      if (node.type !== 'text' || !node.data.includes(TOMAN)) {
+        return;
+      }
+
+      let parent = node.parent;
+      while (parent && parent.type !== 'root' && !candidates.has(parent)) {
+        candidates.add(parent);
+        parent = parent.parent;
+      }
+    });
+
     // Collect all price elements, excluding crossed-out prices
     $('*').each((i, elem) => {
+      if (!candidates.has(elem)) {
+        return;
+      }
+
       const $elem = $(elem);
 
       // Skip if element or parent has strikethrough/line-through style (old prices)
@@ -47,27 +325,21 @@ async function scrapePrice(url) {
 
       const text = $elem.text().trim();
 
-      // Match Persian/Arabic numbers with commas followed by تومان
-      const priceMatches = text.match(/([۰-۹0-9٬,]+)\s*تومان/g);
-
-      if (priceMatches && text.length < 150) {
-        priceMatches.forEach(match => {
-          const priceMatch = match.match(/([۰-۹0-9٬,]+)\s*تومان/);
-          if (priceMatch) {
-            const priceText = priceMatch[1];
-            // Convert to English numbers for comparison
-            const priceNum = parseInt(toEnglishNumber(priceText));
-
-            // Only consider prices above 1000 Toman (filter out small numbers)
-            if (priceNum > 1000 && priceText.length >= 5) {
-              prices.push({
-                text: priceText,
-                value: priceNum,
-                elemTextLength: text.length
-              });
-            }
+      if (text.length < 150) {
+        // Match Persian/Arabic numbers with commas followed by تومان
+        for (const priceText of findPriceTexts(text)) {
+          // Convert to English numbers for comparison
+          const priceNum = parseInt(toEnglishNumber(priceText));
+
+          // Only consider prices above 1000 Toman (filter out small numbers)
+          if (priceNum > 1000 && priceText.length >= 5) {
+            prices.push({
+              text: priceText,
+              value: priceNum,
+              elemTextLength: text.length
+            });
           }
-        });
+        }
       }
     });
 
@@ -95,21 +367,86 @@ async function scrapePrice(url) {
   }
 }
 
+// How long a scraped price is reused before the page is fetched again. Kept below the
+// dashboard's smallest refresh interval (1 s) so it only merges near-simultaneous polls
+// and never serves a price older than the interval the user picked
+const PRICE_CACHE_TTL_MS = 500;
+
+// Recent successful scrapes by URL: { price, timestamp, fetchedAt }
+const priceCache = new Map();
+
+// Scrapes currently in progress by URL, so concurrent callers share one request
+const inflightScrapes = new Map();
+
+// Get the price for a URL, reusing a recent result or an in-progress scrape when possible
+async function getPrice(url) {
+  const cached = priceCache.get(url);
+  if (cached && performance.now() - cached.fetchedAt < PRICE_CACHE_TTL_MS) {
+    return cached;
+  }
+
+  let scrape = inflightScrapes.get(url);
+  if (!scrape) {
+    scrape = scrapePrice(url).then(price => {
+      const result = {
+        price,
+        timestamp: new Date().toISOString(),
+        fetchedAt: performance.now()
+      };
+
+      // Only cache successes so a failed scrape is retried on the next request, and
+      // skip scrapes that were forgotten (product deleted) while they were running
+      if (price !== null && inflightScrapes.get(url) === scrape) {
+        priceCache.set(url, result);
+      }
+
+      return result;
+    }).finally(() => {
+      if (inflightScrapes.get(url) === scrape) {
+        inflightScrapes.delete(url);
+      }
+    });
+
+    inflightScrapes.set(url, scrape);
+  }
+
+  return scrape;
+}
+
+// Drop the cached and in-progress price for a URL that is no longer monitored
+function forgetPrice(url) {
+  priceCache.delete(url);
+  inflightScrapes.delete(url);
+}
+
+// Drop cached prices for URLs that are not in the product list (e.g. after a hand edit)
+function prunePriceCache(products) {
+  const urls = new Set(products.map(product => product.url));
+
+  for (const url of priceCache.keys()) {
+    if (!urls.has(url)) {
+      forgetPrice(url);
+    }
+  }
+}
+
 // Helper function to convert Persian/Arabic numerals to English (moved up for use in scrapePrice)
+// Single pass over the char codes: Persian (۰-۹) and Arabic (٠-٩) digits map to 0-9,
+// and commas and other non-numeric characters are dropped
 function toEnglishNumber(str) {
-  const persianNumbers = ['۰', '۱', '۲', '۳', '۴', '۵', '۶', '۷', '۸', '۹'];
-  const arabicNumbers = ['٠', '١', '٢', '٣', '٤', '٥', '٦', '٧', '٨', '٩'];
+  let result = '';
 
-  let result = str;
-  persianNumbers.forEach((num, idx) => {
-    result = result.replace(new RegExp(num, 'g'), idx.toString());
-  });
-  arabicNumbers.forEach((num, idx) => {
-    result = result.replace(new RegExp(num, 'g'), idx.toString());
-  });
+  for (let i = 0; i < str.length; i++) {
+    const code = str.charCodeAt(i);
 
-  // Remove commas and other non-numeric characters
-  result = result.replace(/[^0-9]/g, '');
+    if (code >= 0x30 && code <= 0x39) {
+      result += str[i];
+    } else if (code >= 0x06F0 && code <= 0x06F9) {
+      result += String.fromCharCode(code - 0x06F0 + 0x30);
+    } else if (code >= 0x0660 && code <= 0x0669) {
+      result += String.fromCharCode(code - 0x0660 + 0x30);
+    }
+  }
 
   return result;
 }
@@ -134,9 +471,16 @@ function toPersianNumber(num) {
 // API endpoint to get all products with current prices
 app.get('/api/products', async (req, res) => {
   try {
-    const data = await fs.readFile(PRODUCTS_FILE, 'utf8');
-    const products = JSON.parse(data);
-    res.json(products);
+    const products = await loadProducts();
+
+    if (productsCache.responseBody === null) {
+      productsCache.responseBody = JSON.stringify(products);
+      productsCache.responseEtag = '"' + crypto.createHash('sha1').update(productsCache.responseBody).digest('base64') + '"';
+    }
+
+    // Express answers 304 itself when If-None-Match matches the ETag
+    res.set('ETag', productsCache.responseEtag);
+    res.type('json').send(productsCache.responseBody);
   } catch (error) {
     console.error('Error reading products:', error);
     res.status(500).json({ error: 'Failed to read products' });
@@ -147,21 +491,20 @@ app.get('/api/products', async (req, res) => {
 app.get('/api/price/:index', async (req, res) => {
   try {
     const index = parseInt(req.params.index);
-    const data = await fs.readFile(PRODUCTS_FILE, 'utf8');
-    const products = JSON.parse(data);
+    const products = await loadProducts();
 
     if (index < 0 || index >= products.length) {
       return res.status(404).json({ error: 'Product not found' });
     }
 
     const product = products[index];
-    const price = await scrapePrice(product.url);
+    const { price, timestamp } = await getPrice(product.url);
 
     res.json({
       name: product.name,
       url: product.url,
       price: price,
-      timestamp: new Date().toISOString()
+      timestamp: timestamp
     });
   } catch (error) {
     console.error('Error fetching price:', error);
@@ -172,21 +515,19 @@ app.get('/api/price/:index', async (req, res) => {
 // API endpoint to get all prices at once
 app.get('/api/prices', async (req, res) => {
   try {
-    const data = await fs.readFile(PRODUCTS_FILE, 'utf8');
-    const products = JSON.parse(data);
+    const products = await loadProducts();
 
-    const pricesPromises = products.map(async (product, index) => {
-      const price = await scrapePrice(product.url);
+    const prices = await mapWithConcurrency(products, SCRAPE_CONCURRENCY, async (product, index) => {
+      const { price, timestamp } = await getPrice(product.url);
       return {
         index,
         name: product.name,
         url: product.url,
         price: price,
-        timestamp: new Date().toISOString()
+        timestamp: timestamp
       };
     });
 
-    const prices = await Promise.all(pricesPromises);
     res.json(prices);
   } catch (error) {
     console.error('Error fetching prices:', error);
@@ -208,12 +549,11 @@ app.post('/api/products', async (req, res) => {
       return res.status(400).json({ error: 'URL must be from techsiro.com' });
     }
 
-    const data = await fs.readFile(PRODUCTS_FILE, 'utf8');
-    const products = JSON.parse(data);
+    const products = await loadProducts();
 
     products.push({ name, url });
 
-    await fs.writeFile(PRODUCTS_FILE, JSON.stringify(products, null, 2));
+    markProductsDirty();
 
     res.json({ success: true, product: { name, url } });
   } catch (error) {
@@ -226,16 +566,16 @@ app.post('/api/products', async (req, res) => {
 app.delete('/api/products/:index', async (req, res) => {
   try {
     const index = parseInt(req.params.index);
-    const data = await fs.readFile(PRODUCTS_FILE, 'utf8');
-    const products = JSON.parse(data);
+    const products = await loadProducts();
 
     if (index < 0 || index >= products.length) {
       return res.status(404).json({ error: 'Product not found' });
     }
 
     const deleted = products.splice(index, 1);
+    forgetPrice(deleted[0].url);
 
-    await fs.writeFile(PRODUCTS_FILE, JSON.stringify(products, null, 2));
+    markProductsDirty();
 
     res.json({ success: true, deleted: deleted[0] });
   } catch (error) {